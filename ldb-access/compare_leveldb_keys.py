@@ -4,8 +4,9 @@
 from __future__ import annotations
 
 import argparse
+import heapq
 from pathlib import Path
-from typing import Dict, Iterator, Set, Tuple
+from typing import Dict, Iterator, Set
 
 
 class LevelDBUnavailableError(RuntimeError):
@@ -16,10 +17,11 @@ def _load_leveldb_reader():
     try:
         import plyvel  # type: ignore
 
-        def iterator(db_path: Path) -> Iterator[Tuple[bytes, bytes]]:
+        def iterator(db_path: Path) -> Iterator[bytes]:
             db = plyvel.DB(str(db_path), create_if_missing=False)
             try:
-                yield from db
+                # Key-only iteration skips value materialization entirely.
+                yield from db.iterator(include_value=False, fill_cache=False)
             finally:
                 db.close()
 
@@ -30,10 +32,11 @@ def _load_leveldb_reader():
     try:
         import leveldb  # type: ignore
 
-        def iterator(db_path: Path) -> Iterator[Tuple[bytes, bytes]]:
+        def iterator(db_path: Path) -> Iterator[bytes]:
             db = leveldb.LevelDB(str(db_path), create_if_missing=False)
-            for key, value in db.RangeIter():
-                yield key, value
+            # The leveldb package has no key-only API, so drop values here.
+            for key, _ in db.RangeIter():
+                yield key
 
         return iterator
     except Exception as exc:
@@ -50,20 +53,24 @@ def _key_to_text(key: bytes) -> str:
 
 
 def _extract_id(key_text: str) -> str:
-    if key_text.startswith("!"):
-        parts = key_text.split("!")
-        if len(parts) >= 3:
-            return parts[2]
-    return ""
+    if not key_text.startswith("!"):
+        return ""
+    _, _, rest = key_text.partition("!")
+    _, sep, tail = rest.partition("!")
+    if not sep:
+        return ""
+    return tail.partition("!")[0]
 
 
-def _load_keys(db_dir: Path) -> Set[str]:
+def _load_keys(db_dir: Path) -> Set[bytes]:
     reader = _load_leveldb_reader()
-    return {_key_to_text(k) for k, _ in reader(db_dir)}
+    return set(reader(db_dir))
 
 
-def _summarize(keys: Set[str]) -> Dict[str, int]:
-    ids = {_extract_id(k) for k in keys if _extract_id(k)}
+def _summarize(keys: Set[bytes]) -> Dict[str, int]:
+    # The bytes prefix check skips the UTF-8 decode for keys that cannot
+    # carry an id anyway.
+    ids = {eid for k in keys if k.startswith(b"!") and (eid := _extract_id(_key_to_text(k)))}
     return {"keys": len(keys), "ids": len(ids)}
 
 
@@ -79,22 +86,24 @@ def main() -> int:
     left_keys = _load_keys(left)
     right_keys = _load_keys(right)
 
-    only_left = sorted(left_keys - right_keys)
-    only_right = sorted(right_keys - left_keys)
+    only_left = left_keys - right_keys
+    only_right = right_keys - left_keys
 
     print(f"left:  {left} -> {_summarize(left_keys)}")
     print(f"right: {right} -> {_summarize(right_keys)}")
     print(f"only_left: {len(only_left)}")
     print(f"only_right: {len(only_right)}")
 
+    # nsmallest keeps the samples deterministic without a full O(N log N)
+    # sort of the difference sets.
     if only_left:
         print("sample only_left:")
-        for k in only_left[:20]:
-            print(f"  {k}")
+        for k in heapq.nsmallest(20, only_left):
+            print(f"  {_key_to_text(k)}")
     if only_right:
         print("sample only_right:")
-        for k in only_right[:20]:
-            print(f"  {k}")
+        for k in heapq.nsmallest(20, only_right):
+            print(f"  {_key_to_text(k)}")
 
     return 0 if not only_left and not only_right else 2
 
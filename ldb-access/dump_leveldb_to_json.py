@@ -16,10 +16,20 @@ from __future__ import annotations
 import argparse
 import base64
 import json
+import os
 import re
+import sys
 import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None
 
 
 class LevelDBUnavailableError(RuntimeError):
@@ -81,15 +91,22 @@ def _parse_key_parts(raw: bytes) -> Tuple[str, str, str]:
     except UnicodeDecodeError:
         return "binary", "", ""
 
-    if text.startswith("!"):
-        parts = text.split("!")
+    # Check the prefix on the raw bytes and bound the split; keys only need
+    # their first three segments.
+    if raw.startswith(b"!"):
+        parts = text.split("!", 3)
         if len(parts) >= 3 and parts[1]:
             return parts[1], parts[2], text
     return "misc", text, text
 
 
+# \w matches the same Unicode alphanumerics (plus underscore) the old
+# per-character isalnum() check kept, so localized names stay intact.
+_SAFE_RE = re.compile(r"[^\w\-]")
+
+
 def _safe_name(name: str) -> str:
-    cleaned = "".join(ch if ch.isalnum() or ch in ("-", "_") else "_" for ch in str(name).strip())
+    cleaned = _SAFE_RE.sub("_", str(name).strip())
     return cleaned.strip("_") or "unnamed"
 
 
@@ -102,20 +119,29 @@ def _record_title(value, fallback: str) -> str:
     return _safe_name(fallback)
 
 
-def _folder_payload(record: dict) -> Optional[dict]:
-    value = record.get("value")
+class Rec(NamedTuple):
+    """One extracted LevelDB row; far lighter than a per-record dict."""
+
+    root: str
+    id: str
+    key: str
+    value: object
+
+
+def _folder_payload(record: Rec) -> Optional[dict]:
+    value = record.value
     if isinstance(value, dict):
         return value
     return None
 
 
-def _build_folder_index(folder_records: List[dict]) -> Dict[str, dict]:
+def _build_folder_index(folder_records: List[Rec]) -> Dict[str, dict]:
     folder_by_id: Dict[str, dict] = {}
     for record in folder_records:
         payload = _folder_payload(record)
         if not payload:
             continue
-        folder_id = str(payload.get("_id") or record.get("id") or "").strip()
+        folder_id = str(payload.get("_id") or record.id or "").strip()
         if folder_id:
             folder_by_id[folder_id] = payload
     return folder_by_id
@@ -124,28 +150,50 @@ def _build_folder_index(folder_records: List[dict]) -> Dict[str, dict]:
 def _compute_folder_path(folder_id: str, folder_by_id: Dict[str, dict], memo: Dict[str, Path]) -> Optional[Path]:
     if folder_id in memo:
         return memo[folder_id]
-
-    folder = folder_by_id.get(folder_id)
-    if not folder:
+    if folder_id not in folder_by_id:
         return None
 
-    name = _safe_name(str(folder.get("name", folder_id)))
-    parent_id = folder.get("folder")
-    if isinstance(parent_id, str) and parent_id and parent_id in folder_by_id and parent_id != folder_id:
-        parent = _compute_folder_path(parent_id, folder_by_id, memo)
-        if parent is None:
-            memo[folder_id] = Path(name)
-            return memo[folder_id]
-        memo[folder_id] = parent / name
-        return memo[folder_id]
+    # Walk the parent chain once, collecting unmemoized ancestors, then fill
+    # the memo bottom-up. Iterating instead of recursing means each ancestor
+    # is resolved exactly once per DB and cyclic parent links cannot blow the
+    # recursion limit.
+    chain: List[str] = []
+    on_chain: set = set()
+    current = folder_id
+    while current not in memo and current in folder_by_id and current not in on_chain:
+        chain.append(current)
+        on_chain.add(current)
+        parent_id = folder_by_id[current].get("folder")
+        if not isinstance(parent_id, str) or not parent_id:
+            break
+        current = parent_id
+
+    for fid in reversed(chain):
+        folder = folder_by_id[fid]
+        name = _safe_name(str(folder.get("name", fid)))
+        parent_id = folder.get("folder")
+        parent_path = memo.get(parent_id) if isinstance(parent_id, str) else None
+        memo[fid] = parent_path / name if parent_path is not None else Path(name)
 
-    memo[folder_id] = Path(name)
     return memo[folder_id]
 
 
 def _discover_ldb_files(root: Path, recursive: bool) -> Iterable[Path]:
-    pattern = "**/*.ldb" if recursive else "*.ldb"
-    return sorted(root.glob(pattern))
+    # os.scandir reuses the stat info from the directory read, avoiding the
+    # per-entry Path allocation and second stat that Path.glob incurs.
+    if not root.is_dir():
+        return []
+    found: List[Path] = []
+    stack = [str(root)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        stack.append(entry.path)
+                elif entry.name.endswith(".ldb"):
+                    found.append(Path(entry.path))
+    return sorted(found)
 
 
 def _read_text_if_exists(path: Path) -> Optional[str]:
@@ -154,12 +202,15 @@ def _read_text_if_exists(path: Path) -> Optional[str]:
     return path.read_text(encoding="utf-8", errors="replace").strip()
 
 
+# Default LevelDB DBs typically use leveldb.BytewiseComparator.
+_COMPARATOR_RE = re.compile(rb"leveldb\.[A-Za-z0-9_.-]*Comparator")
+
+
 def _find_comparator_in_manifest(manifest_path: Path) -> Optional[str]:
     if not manifest_path.exists():
         return None
     data = manifest_path.read_bytes()
-    # Default LevelDB DBs typically use leveldb.BytewiseComparator.
-    match = re.search(rb"leveldb\.[A-Za-z0-9_.-]*Comparator", data)
+    match = _COMPARATOR_RE.search(data)
     if not match:
         return None
     return match.group(0).decode("utf-8", errors="replace")
@@ -184,30 +235,61 @@ def _collect_leveldb_meta(db_dir: Path) -> dict:
     }
 
 
-def _extract_records(iterator_factory, db_dir: Path, parse_json_values: bool) -> List[dict]:
-    records: List[dict] = []
+# Root names repeat across all records of a DB; interning each unique one
+# lets the grouping dict in _place_records hit pointer-equality lookups and
+# skips re-sanitizing the same name per record.
+_root_cache: Dict[str, str] = {}
+
+
+def _extract_records(iterator_factory, db_dir: Path, parse_json_values: bool) -> List[Rec]:
+    records: List[Rec] = []
     for key, value in iterator_factory(db_dir):
         root_entry, doc_id, key_text = _parse_key_parts(key)
+        root = _root_cache.get(root_entry)
+        if root is None:
+            root = _root_cache.setdefault(root_entry, sys.intern(_safe_name(root_entry)))
         records.append(
-            {
-                "root": _safe_name(root_entry),
-                "id": doc_id,
-                "key": key_text or _encode_bytes(key),
-                "value": _coerce_value(value, parse_json_values=parse_json_values),
-            }
+            Rec(
+                root=root,
+                id=doc_id,
+                key=key_text or _encode_bytes(key),
+                value=_coerce_value(value, parse_json_values=parse_json_values),
+            )
         )
     return records
 
 
-def _write_json(path: Path, data) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+# Reused encoders: pretty for hand-edited record files, compact for the
+# machine-read aggregate files.
+_INDENT_ENCODER = json.JSONEncoder(ensure_ascii=False, indent=2, separators=(",", ": "))
+_COMPACT_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+_created_dirs: set = set()
 
 
-def _place_records(out_dir: Path, records: List[dict], leveldb_meta: dict) -> None:
-    grouped: Dict[str, List[dict]] = {}
+def _ensure_parent_dir(path: Path) -> None:
+    parent = path.parent
+    if parent not in _created_dirs:
+        parent.mkdir(parents=True, exist_ok=True)
+        _created_dirs.add(parent)
+
+
+def _write_json(path: Path, data, compact: bool = False) -> None:
+    _ensure_parent_dir(path)
+    if orjson is not None:
+        option = 0 if compact else orjson.OPT_INDENT_2
+        path.write_bytes(orjson.dumps(data, option=option))
+        return
+    encoder = _COMPACT_ENCODER if compact else _INDENT_ENCODER
+    with path.open("w", encoding="utf-8") as handle:
+        for chunk in encoder.iterencode(data):
+            handle.write(chunk)
+
+
+def _place_records(out_dir: Path, records: List[Rec], leveldb_meta: dict) -> None:
+    grouped: Dict[str, List[Rec]] = defaultdict(list)
     for rec in records:
-        grouped.setdefault(rec["root"], []).append(rec)
+        grouped[rec.root].append(rec)
 
     folder_records = grouped.get("folders", [])
     folder_by_id = _build_folder_index(folder_records)
@@ -231,10 +313,11 @@ def _place_records(out_dir: Path, records: List[dict], leveldb_meta: dict) -> No
     _write_json(out_dir / "folders.json", folder_manifest)
 
     manifest: List[dict] = []
+    write_jobs: List[Tuple[Path, object]] = []
     for rec in records:
-        root = rec["root"]
-        rec_id = str(rec.get("id") or "").strip() or "unknown"
-        value = rec.get("value")
+        root = rec.root
+        rec_id = str(rec.id or "").strip() or "unknown"
+        value = rec.value
 
         title = _record_title(value, fallback=rec_id)
         file_name = f"{title}__{_safe_name(rec_id)}.json"
@@ -251,17 +334,27 @@ def _place_records(out_dir: Path, records: List[dict], leveldb_meta: dict) -> No
             rel_dir = Path(root)
 
         rel_path = rel_dir / file_name
-        _write_json(out_dir / rel_path, value)
+        write_jobs.append((out_dir / rel_path, value))
 
         manifest.append(
             {
-                "key": rec["key"],
+                "key": rec.key,
                 "root": root,
                 "id": rec_id,
                 "path": str(rel_path),
             }
         )
 
+    # Create all target directories single-threaded, then fan the many tiny
+    # record writes (syscall-bound, GIL released) out over a thread pool.
+    for parent in {path.parent for path, _ in write_jobs}:
+        if parent not in _created_dirs:
+            parent.mkdir(parents=True, exist_ok=True)
+            _created_dirs.add(parent)
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(lambda job: _write_json(job[0], job[1]), write_jobs))
+
     _write_json(
         out_dir / "manifest.json",
         {
@@ -269,45 +362,67 @@ def _place_records(out_dir: Path, records: List[dict], leveldb_meta: dict) -> No
             "leveldb_meta": leveldb_meta,
             "records": manifest,
         },
+        compact=True,
     )
 
     # Keep grouped files for reference/debugging.
     for root, rows in sorted(grouped.items()):
-        _write_json(out_dir / f"{root}.json", rows)
+        _write_json(out_dir / f"{root}.json", [row._asdict() for row in rows])
+
+
+def _process_one_db(db_dir: Path, in_root: Path, out_root: Path, parse_json_values: bool) -> int:
+    """Dump a single DB directory; also runs in worker processes."""
+    iterator_factory = _load_leveldb_backend()
+    out_dir = out_root / db_dir.relative_to(in_root)
+
+    print(f"Reading {db_dir}")
+    records = _extract_records(iterator_factory, db_dir, parse_json_values=parse_json_values)
+    leveldb_meta = _collect_leveldb_meta(db_dir)
+    _write_json(out_dir / "full.json", [rec._asdict() for rec in records], compact=True)
+    _place_records(out_dir, records, leveldb_meta=leveldb_meta)
+    print(f"Finished {db_dir}: {len(records)} total entries")
+    return len(records)
 
 
 def dump_all(in_root: Path, out_root: Path, recursive: bool, parse_json_values: bool) -> int:
     started = time.perf_counter()
-    iterator_factory = _load_leveldb_backend()
+    _load_leveldb_backend()  # Fail fast before any workers start.
     ldb_files = list(_discover_ldb_files(in_root, recursive=recursive))
 
     if not ldb_files:
         print(f"No .ldb files found under {in_root}")
         return 1
 
-    processed_db_dirs: set[Path] = set()
-
+    db_dirs: List[Path] = []
+    seen_db_dirs: set[Path] = set()
     for ldb_file in ldb_files:
         db_dir = ldb_file.parent
-        rel_dir = db_dir.relative_to(in_root)
-        out_dir = out_root / rel_dir
-
-        if db_dir in processed_db_dirs:
+        if db_dir in seen_db_dirs:
             print(f"Skipping {ldb_file}: database directory already dumped")
             continue
-
-        print(f"Reading {db_dir}")
-        records = _extract_records(iterator_factory, db_dir, parse_json_values=parse_json_values)
-        leveldb_meta = _collect_leveldb_meta(db_dir)
-        _write_json(out_dir / "full.json", records)
-        _place_records(out_dir, records, leveldb_meta=leveldb_meta)
-        print(f"Finished {db_dir}: {len(records)} total entries")
-        processed_db_dirs.add(db_dir)
+        seen_db_dirs.add(db_dir)
+        db_dirs.append(db_dir)
+
+    # DB directories are independent (own file handles, own output trees),
+    # so fan them out across cores.
+    if len(db_dirs) > 1:
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            list(
+                executor.map(
+                    _process_one_db,
+                    db_dirs,
+                    repeat(in_root),
+                    repeat(out_root),
+                    repeat(parse_json_values),
+                )
+            )
+    else:
+        _process_one_db(db_dirs[0], in_root, out_root, parse_json_values)
 
     elapsed = time.perf_counter() - started
     print("Conversion stats:")
     print(f"duration_seconds: {elapsed:.3f}")
-    print(f"folders_processed: {len(processed_db_dirs)}")
+    print(f"folders_processed: {len(db_dirs)}")
     print(f"files_processed: {len(ldb_files)}")
 
     return 0
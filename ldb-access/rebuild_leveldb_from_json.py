@@ -12,13 +12,22 @@ from __future__ import annotations
 import argparse
 import base64
 import json
+import os
 import random
+import re
 import string
 import shutil
 import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 from typing import Dict, Iterable, List, Optional, Set, Tuple
 
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None
+
 
 class LevelDBUnavailableError(RuntimeError):
     pass
@@ -57,13 +66,16 @@ class LevelDBWriter:
     def __init__(self, db_path: Path):
         self.db_path = db_path
         self._backend = None
+        self._batch = None
         self._open()
 
     def _open(self) -> None:
         try:
             import plyvel  # type: ignore
 
-            self._backend = ("plyvel", plyvel.DB(str(self.db_path), create_if_missing=True))
+            db = plyvel.DB(str(self.db_path), create_if_missing=True)
+            self._backend = ("plyvel", db)
+            self._batch = db.write_batch(transaction=False)
             return
         except Exception:
             pass
@@ -72,6 +84,7 @@ class LevelDBWriter:
             import leveldb  # type: ignore
 
             self._backend = ("leveldb", leveldb.LevelDB(str(self.db_path), create_if_missing=True))
+            self._batch = leveldb.WriteBatch()
             return
         except Exception as exc:
             raise LevelDBUnavailableError(
@@ -79,27 +92,46 @@ class LevelDBWriter:
             ) from exc
 
     def put(self, key: bytes, value: bytes) -> None:
-        backend_name, backend = self._backend
+        # Puts accumulate in a write batch; one batched write on close avoids
+        # a separate WAL flush per record.
+        backend_name, _ = self._backend
         if backend_name == "plyvel":
-            backend.put(key, value)
+            self._batch.put(key, value)
         else:
-            backend.Put(key, value)
+            self._batch.Put(key, value)
 
     def close(self) -> None:
-        if self._backend and self._backend[0] == "plyvel":
-            self._backend[1].close()
+        if not self._backend:
+            return
+        backend_name, backend = self._backend
+        if backend_name == "plyvel":
+            self._batch.write()
+            backend.close()
+        else:
+            backend.Write(self._batch, sync=False)
 
 
 def _read_json(path: Path):
-    return json.loads(path.read_text(encoding="utf-8"))
+    raw = path.read_bytes()
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
 
 
 def _write_json(path: Path, data) -> None:
+    if orjson is not None:
+        path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        return
     path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
 
 
+# \w matches the same Unicode alphanumerics (plus underscore) the old
+# per-character isalnum() check kept, so localized names stay intact.
+_SAFE_RE = re.compile(r"[^\w\-]")
+
+
 def _safe_name(name: str) -> str:
-    cleaned = "".join(ch if ch.isalnum() or ch in ("-", "_") else "_" for ch in str(name).strip())
+    cleaned = _SAFE_RE.sub("_", str(name).strip())
     return cleaned.strip("_") or "unnamed"
 
 
@@ -132,6 +164,8 @@ def _encode_value(value) -> bytes:
         return base64.b64decode(value["base64"])
     if isinstance(value, str):
         return value.encode("utf-8")
+    if orjson is not None:
+        return orjson.dumps(value)
     return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
 
 
@@ -197,10 +231,12 @@ def _extract_id_from_key(key: str) -> Optional[str]:
     return rec_id or None
 
 
+_ID_ALPHABET = string.ascii_letters + string.digits
+
+
 def _random_id(used_ids: Set[str]) -> str:
-    alphabet = string.ascii_letters + string.digits
     while True:
-        candidate = "".join(random.choice(alphabet) for _ in range(16))
+        candidate = "".join(random.choices(_ID_ALPHABET, k=16))
         if candidate not in used_ids:
             return candidate
 
@@ -320,31 +356,54 @@ def _build_new_records(db_out_dir: Path, known_paths: Set[str], used_ids: Set[st
     return records
 
 
-def _snapshot_db(iterator_factory, db_dir: Path) -> Dict[str, bytes]:
-    rows: Dict[str, bytes] = {}
-    if not db_dir.exists():
-        return rows
-    for key, value in iterator_factory(db_dir):
-        try:
-            k = key.decode("utf-8")
-        except UnicodeDecodeError:
-            k = base64.b64encode(key).decode("ascii")
-        rows[k] = value
-    return rows
-
-
 def _values_differ(left: bytes, right: bytes) -> bool:
     if left == right:
         return False
     return _decode_value(left) != _decode_value(right)
 
 
-def _print_db_diff(db_name: str, source_rows: Dict[str, bytes], rebuilt_rows: Dict[str, bytes]) -> None:
-    source_keys = set(source_rows.keys())
-    rebuilt_keys = set(rebuilt_rows.keys())
-    added = rebuilt_keys - source_keys
-    removed = source_keys - rebuilt_keys
-    changed = {k for k in (source_keys & rebuilt_keys) if _values_differ(source_rows[k], rebuilt_rows[k])}
+_DIFF_SAMPLE_LIMIT = 20
+
+
+def _diff_dbs(source_iter, rebuilt_iter) -> Tuple[int, int, int, List[str]]:
+    """Merge-diff two key-sorted (key, value) iterators holding one row per side.
+
+    Returns added/removed/changed counts (rebuilt relative to source) plus up
+    to _DIFF_SAMPLE_LIMIT record names for display, without materializing
+    either DB in memory.
+    """
+    added = removed = changed = 0
+    names: Set[str] = set()
+
+    def note(key: bytes, value: bytes) -> None:
+        if len(names) < _DIFF_SAMPLE_LIMIT:
+            names.add(_record_title(_decode_value(value), key.decode("utf-8", errors="replace")))
+
+    source = next(source_iter, None)
+    rebuilt = next(rebuilt_iter, None)
+    while source is not None or rebuilt is not None:
+        if rebuilt is None or (source is not None and source[0] < rebuilt[0]):
+            removed += 1
+            note(*source)
+            source = next(source_iter, None)
+        elif source is None or rebuilt[0] < source[0]:
+            added += 1
+            note(*rebuilt)
+            rebuilt = next(rebuilt_iter, None)
+        else:
+            if _values_differ(source[1], rebuilt[1]):
+                changed += 1
+                note(*rebuilt)
+            source = next(source_iter, None)
+            rebuilt = next(rebuilt_iter, None)
+
+    return added, removed, changed, sorted(names)
+
+
+def _print_db_diff(db_name: str, iterator_factory, source_db_dir: Path, rebuilt_db_dir: Path) -> None:
+    source_iter = iter(iterator_factory(source_db_dir)) if source_db_dir.exists() else iter(())
+    rebuilt_iter = iter(iterator_factory(rebuilt_db_dir)) if rebuilt_db_dir.exists() else iter(())
+    added, removed, changed, names = _diff_dbs(source_iter, rebuilt_iter)
 
     if not added and not removed and not changed:
         print(f"{db_name}: no element differences between source and rebuilt idb")
@@ -352,93 +411,107 @@ def _print_db_diff(db_name: str, source_rows: Dict[str, bytes], rebuilt_rows: Di
 
     print(
         f"{db_name}: element differences found "
-        f"(added={len(added)}, removed={len(removed)}, changed={len(changed)})"
+        f"(added={added}, removed={removed}, changed={changed})"
     )
 
-    names: List[str] = []
-    for key in sorted(added):
-        names.append(_record_title(_decode_value(rebuilt_rows[key]), key))
-    for key in sorted(removed):
-        names.append(_record_title(_decode_value(source_rows[key]), key))
-    for key in sorted(changed):
-        names.append(_record_title(_decode_value(rebuilt_rows[key]), key))
-
-    for name in sorted(set(names)):
+    for name in names:
         print(name)
 
 
-def rebuild_all(out_root: Path, deploy_root: Path, source_root: Path) -> int:
+def _rebuild_one_db(db_out_dir: Path, deploy_root: Path, source_root: Path, skip_diff: bool) -> int:
+    """Rebuild a single DB directory; also runs in worker processes."""
+    iterator_factory = _load_leveldb_iterator()
+    db_name = db_out_dir.name
+    deploy_db_dir = deploy_root / db_name
+    source_db_dir = source_root / db_name
+
+    if deploy_db_dir.exists():
+        shutil.rmtree(deploy_db_dir)
+
+    print(f"Rebuilding {db_name} -> {deploy_db_dir}")
+    writer = LevelDBWriter(deploy_db_dir)
+    try:
+        manifest, leveldb_meta = _load_manifest(db_out_dir)
+        known_paths = {str(item.get("path")) for item in manifest if isinstance(item.get("path"), str)}
+        used_ids = {
+            rec_id
+            for rec_id in (
+                _extract_id_from_key(str(item.get("key")))
+                for item in manifest
+                if isinstance(item.get("key"), str)
+            )
+            if rec_id
+        }
+
+        known_records = _build_known_records(db_out_dir, manifest)
+        new_records = _build_new_records(db_out_dir, known_paths, used_ids)
+        files_processed = len(known_records) + len(new_records)
+
+        merged: Dict[str, bytes] = {}
+        for key, value in known_records:
+            merged[key] = value
+        for key, value in new_records:
+            merged[key] = value
+
+        # Insert in byte order (matching leveldb.BytewiseComparator) so
+        # LevelDB flushes the batch as sequential SSTable writes.
+        for key_bytes, value in sorted((k.encode("utf-8"), v) for k, v in merged.items()):
+            writer.put(key_bytes, value)
+
+        comparator = leveldb_meta.get("comparator")
+        if isinstance(comparator, str) and comparator and comparator != "leveldb.BytewiseComparator":
+            print(
+                f"Warning: source comparator is {comparator}; rebuild uses default "
+                "LevelDB comparator (leveldb.BytewiseComparator)."
+            )
+
+        print(
+            f"Wrote {len(known_records)} manifest records, "
+            f"{len(new_records)} new records ({len(merged)} total keys)"
+        )
+    finally:
+        writer.close()
+
+    if skip_diff:
+        return files_processed
+    if not source_db_dir.exists():
+        print(f"{db_name}: no source DB under {source_root}; skipping diff")
+        return files_processed
+    _print_db_diff(db_name, iterator_factory, source_db_dir, deploy_db_dir)
+    return files_processed
+
+
+def rebuild_all(out_root: Path, deploy_root: Path, source_root: Path, skip_diff: bool = False) -> int:
     started = time.perf_counter()
     db_dirs = list(_iter_db_dirs(out_root))
     if not db_dirs:
         print(f"No DB directories found under {out_root}")
         return 1
 
-    iterator_factory = _load_leveldb_iterator()
+    _load_leveldb_iterator()  # Fail fast before any workers start.
     deploy_root.mkdir(parents=True, exist_ok=True)
-    folders_processed = 0
-    files_processed = 0
-
-    for db_out_dir in db_dirs:
-        db_name = db_out_dir.name
-        deploy_db_dir = deploy_root / db_name
-        source_db_dir = source_root / db_name
-
-        if deploy_db_dir.exists():
-            shutil.rmtree(deploy_db_dir)
 
-        print(f"Rebuilding {db_name} -> {deploy_db_dir}")
-        writer = LevelDBWriter(deploy_db_dir)
-        try:
-            manifest, leveldb_meta = _load_manifest(db_out_dir)
-            known_paths = {str(item.get("path")) for item in manifest if isinstance(item.get("path"), str)}
-            used_ids = {
-                rec_id
-                for rec_id in (
-                    _extract_id_from_key(str(item.get("key")))
-                    for item in manifest
-                    if isinstance(item.get("key"), str)
-                )
-                if rec_id
-            }
-
-            known_records = _build_known_records(db_out_dir, manifest)
-            new_records = _build_new_records(db_out_dir, known_paths, used_ids)
-            files_processed += len(known_records) + len(new_records)
-
-            merged: Dict[str, bytes] = {}
-            for key, value in known_records:
-                merged[key] = value
-            for key, value in new_records:
-                merged[key] = value
-
-            for key, value in merged.items():
-                writer.put(key.encode("utf-8"), value)
-
-            comparator = leveldb_meta.get("comparator")
-            if isinstance(comparator, str) and comparator and comparator != "leveldb.BytewiseComparator":
-                print(
-                    f"Warning: source comparator is {comparator}; rebuild uses default "
-                    "LevelDB comparator (leveldb.BytewiseComparator)."
+    # DB directories are independent (own manifests, own deploy targets),
+    # so fan them out across cores.
+    if len(db_dirs) > 1:
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            counts = list(
+                executor.map(
+                    _rebuild_one_db,
+                    db_dirs,
+                    repeat(deploy_root),
+                    repeat(source_root),
+                    repeat(skip_diff),
                 )
-
-            print(
-                f"Wrote {len(known_records)} manifest records, "
-                f"{len(new_records)} new records ({len(merged)} total keys)"
             )
-        finally:
-            writer.close()
-
-        source_rows = _snapshot_db(iterator_factory, source_db_dir)
-        rebuilt_rows = _snapshot_db(iterator_factory, deploy_db_dir)
-        _print_db_diff(db_name, source_rows, rebuilt_rows)
-        folders_processed += 1
+    else:
+        counts = [_rebuild_one_db(db_dirs[0], deploy_root, source_root, skip_diff)]
 
     elapsed = time.perf_counter() - started
     print("Rebuild stats:")
     print(f"duration_seconds: {elapsed:.3f}")
-    print(f"folders_processed: {folders_processed}")
-    print(f"files_processed: {files_processed}")
+    print(f"folders_processed: {len(db_dirs)}")
+    print(f"files_processed: {sum(counts)}")
 
     return 0
 
@@ -463,6 +536,11 @@ def parse_args() -> argparse.Namespace:
         default="in",
         help="Source LevelDB root for diff comparison (default: in)",
     )
+    parser.add_argument(
+        "--skip-diff",
+        action="store_true",
+        help="Skip the source vs rebuilt element diff after each DB",
+    )
     return parser.parse_args()
 
 
@@ -471,7 +549,7 @@ def main() -> int:
     out_root = Path(args.out_root).resolve()
     deploy_root = Path(args.deploy_root).resolve()
     source_root = Path(args.source_root).resolve()
-    return rebuild_all(out_root, deploy_root, source_root)
+    return rebuild_all(out_root, deploy_root, source_root, skip_diff=args.skip_diff)
 
 
 if __name__ == "__main__":